@@ -44,31 +44,31 @@ This package builds custom WordLists (for BruteForce).
 >>> 
 
 ~# python3.11 WordListGenerator.py -e "a=[1-3]" -p 'ABC%(a){2}'
+ABC11
+ABC12
+ABC13
+ABC21
 ABC22
 ABC23
-ABC21
+ABC31
 ABC32
 ABC33
-ABC31
-ABC12
-ABC13
-ABC11
 ~# python3.11 WordListGenerator.py -w "b=test.txt" -e "123" -p '%(b)%(123)'
-abcc13
 abcc11
 abcc12
-abcc33
+abcc13
 abcc31
 abcc32
-abcc23
+abcc33
 abcc21
 abcc22
-abcb13
+abcc23
 abcb11
 abcb12
-abcb33
+abcb13
 abcb31
 abcb32
+abcb33
 ~# python3.11 WordListGenerator.py -w "b=test.txt" -e "a=123" -t 0.0004 -p '%(b)%(a)'
 abcc11
 abcc12
@@ -86,14 +86,14 @@ abcb31
 abcb32
 abcb33
 ~# python3.11 WordListGenerator.py -w "b=test.txt" -e "a=123" -m 5 -p '%(b)%(a)'
-abcc13
-abcc12
 abcc11
-abcc33
+abcc12
+abcc13
+abcc31
 abcc32
 ~# python3.11 WordListGenerator.py -w "b=test.txt" -e "123" -m 5 -p '%(b)%(123)' -E ascii -f "abc.txt"
 ~# python3.11 WordListGenerator.py -e "123" -p 'ABC%(123)' -E ascii -d ","
-ABC3,ABC1,ABC2,
+ABC1,ABC2,ABC3,
 ~#
 
 Tests:
@@ -121,21 +121,141 @@ under certain conditions.
 __copyright__ = copyright
 __description__ = "This package builds custom WordLists (for BruteForce)."
 
-print(copyright)
-
 from string import ascii_uppercase, ascii_lowercase, digits, punctuation
-from argparse import ArgumentParser, Namespace
-from re import compile as recompile, finditer
-from typing import TypeVar, Tuple
+from argparse import ArgumentParser, Namespace, RawDescriptionHelpFormatter
+from re import compile as recompile
+from typing import Callable, Iterator, Optional, Tuple, List, Union
+from itertools import product, islice
 from dataclasses import dataclass
 from time import perf_counter
-from io import TextIOWrapper
 from sys import exit, stdout
-from os import path
+from concurrent.futures import ProcessPoolExecutor
+from os import path, cpu_count, linesep, stat
+from stat import S_ISREG
+from locale import getpreferredencoding
+from codecs import lookup
+from math import prod
+from operator import itemgetter
+from mmap import mmap, ACCESS_READ
 
 ascii_visible = "0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ!\"#$%&'()*+,-./:;<=>?@[\\]^_`{|}~"
 
-StringOrNone = TypeVar("StringOrNone", str, None)
+MAX_FILE_SIZE = 4 * 1024 * 1024
+BATCH_SIZE = 4096
+CLOCK_INTERVAL = 1024
+JIT_MIN_WORDS = 1 << 20
+
+_CHARS_RE = recompile(r"(\[.\-.\])|(\((?:\w+\|)+\w+\))")
+_MULT_RE = recompile(r"(%\([^)]*\))\{(\d+)\}")
+
+
+def _emit_words(
+    chars: "numpy.ndarray",
+    lengths: "numpy.ndarray",
+    template: "numpy.ndarray",
+    offsets: "numpy.ndarray",
+    indices: "numpy.ndarray",
+    output: "numpy.ndarray",
+    count: int,
+) -> int:
+
+    """
+    This function writes count words in the output buffer and returns
+    the number of bytes written. indices is the position of the next
+    word in each characters list, it is updated for the next call.
+    """
+
+    size = template.shape[0]
+    slots = offsets.shape[0]
+    base = 0
+
+    for _ in range(count):
+        for i in range(size):
+            output[base + i] = template[i]
+
+        for k in range(slots):
+            output[base + offsets[k]] = chars[k, indices[k]]
+
+        k = slots - 1
+        while k >= 0:
+            indices[k] += 1
+            if indices[k] < lengths[k]:
+                break
+            indices[k] = 0
+            k -= 1
+
+        base += size
+
+    return base
+
+
+_emit_njit = None
+
+
+def _load_emit_njit() -> Optional[Callable]:
+
+    """
+    This function imports numba on first use and returns _emit_words
+    compiled, returns None when numba is not installed.
+    """
+
+    global _emit_njit
+
+    if _emit_njit is None:
+        try:
+            from numba import njit
+        except ImportError:
+            _emit_njit = False
+        else:
+            _emit_njit = njit(cache=True, boundscheck=False)(_emit_words)
+
+    return _emit_njit or None
+
+
+def _words_size(template: bytes, value_lists: List[List[bytes]]) -> int:
+
+    """
+    This function returns the size of all words
+    built from template and values.
+
+    >>> _words_size(b"%s-%s\\n", [[b"a", b"bc"], [b"d"]])
+    9
+    >>>
+    """
+
+    words = prod(map(len, value_lists))
+    if not words:
+        return 0
+
+    size = words * len(template % ((b"",) * len(value_lists)))
+
+    for values in value_lists:
+        size += sum(map(len, values)) * (words // len(values))
+
+    return size
+
+
+def _write_words(
+    template: bytes,
+    value_lists: List[List[bytes]],
+    filename: str,
+    offset: int,
+) -> None:
+
+    """
+    This function writes all words built from template and values
+    in a file from offset (it runs in worker processes).
+    """
+
+    words = map(template.__mod__, product(*value_lists))
+
+    with open(filename, "r+b", buffering=1 << 20) as file:
+        file.seek(offset)
+        batch = list(islice(words, BATCH_SIZE))
+
+        while batch:
+            file.write(b"".join(batch))
+            batch = list(islice(words, BATCH_SIZE))
 
 
 @dataclass
@@ -161,8 +281,8 @@ class PatternEnumerator:
         5
         >>> p = PatternEnumerator("1", "B[3-1]a", False, None)
         >>> p.build_chars()
-        >>> len(p.chars)
-        5
+        >>> p.chars
+        ('1', '2', '3', 'B', 'a')
         >>> p = PatternEnumerator("1", None, True, "filename.txt")
         >>> p.build_chars()
         >>> p.chars
@@ -170,36 +290,28 @@ class PatternEnumerator:
 
         if not self.is_file:
             chars = set()
-            regex = recompile(r"\[.\-.\]")
-
-            for result in regex.finditer(self.chars):
-                pattern = result.group()
-
-                start = ord(pattern[1])
-                end = ord(pattern[3])
+            leftover = []
+            last = 0
 
-                if start > end:
-                    start, end = end, start
+            for result in _CHARS_RE.finditer(self.chars):
+                leftover.append(self.chars[last : result.start()])
+                last = result.end()
+                range_, words = result.groups()
 
-                for char in range(start, end + 1):
-                    chars.add(chr(char))
+                if range_ is not None:
+                    start = ord(range_[1])
+                    end = ord(range_[3])
 
-                self.chars = self.chars.replace(pattern, "", 1)
+                    if start > end:
+                        start, end = end, start
 
-            regex = recompile(r"\((\w+\|)+\w+\)")
+                    chars.update(map(chr, range(start, end + 1)))
+                else:
+                    chars.update(words[1:-1].split("|"))
 
-            for result in regex.finditer(self.chars):
-                pattern = result.group()
-
-                for word in pattern[1:-1].split("|"):
-                    chars.add(word)
-
-                self.chars = self.chars.replace(pattern, "", 1)
-
-            for char in self.chars:
-                chars.add(char)
-
-            self.chars = chars
+            leftover.append(self.chars[last:])
+            chars.update("".join(leftover))
+            self.chars = tuple(sorted(chars))
 
     def get_values(self, encoding: str = "utf-8", delimiter: str = "\n"):
 
@@ -214,42 +326,106 @@ class PatternEnumerator:
         abcc1
         >>> len(list_)
         5
+        >>> from tempfile import TemporaryDirectory
+        >>> with TemporaryDirectory() as directory:
+        ...     filename = path.join(directory, "empty.txt")
+        ...     open(filename, "w").close()
+        ...     list(PatternEnumerator("empty", None, True, filename).get_values())
+        []
+        >>> from os import pipe, write, close
+        >>> reader, writer = pipe()
+        >>> write(writer, b"w1\\nw2\\n")
+        6
+        >>> close(writer)
+        >>> list(PatternEnumerator("pipe", None, True, reader).get_values())
+        ['w1', 'w2']
         >>>
         """
 
-        if self.is_file:
-            with open(self.filename, encoding="utf-8") as file:
-                word = self.get_word_from_file(file, delimiter)
-                while word:
-                    yield word
-                    word = self.get_word_from_file(file, delimiter)
-        else:
+        if not self.is_file:
             yield from self.chars
+            return
+
+        status = stat(self.filename)
+        if (
+            S_ISREG(status.st_mode)
+            and status.st_size
+            and len(delimiter) == 1
+            and delimiter != "\r"
+        ):
+            yield from self._iter_file_mmap(delimiter)
+        else:
+            yield from self._iter_file_buffered(delimiter)
 
-    def get_word_from_file(self, file: TextIOWrapper, delimiter: str = "\n"):
+    def _iter_file_buffered(self, delimiter: str = "\n") -> Iterator[str]:
 
         """
-        This function returns word from custom WordList.
+        This generator returns words from a wordlist read in chunks,
+        it is used for files that cannot be memory mapped
+        (pipes, devices and empty files) and for delimiters
+        that are not a single character.
+        """
 
-        >>> from io import BytesIO
-        >>> a = TextIOWrapper(BytesIO(b'abc\\n123\\ntest'))
-        >>> p = PatternEnumerator("1", None, True, "filename.txt")
-        >>> w=True
-        >>> while w: print(w:=p.get_word_from_file(a))
-        abc
-        123
-        test
-        <BLANKLINE>
+        with open(self.filename, encoding="utf-8") as file:
+            read = file.read
+            buffer = ""
+            chunk = read(1 << 20)
+            while chunk:
+                words = (buffer + chunk).split(delimiter)
+                buffer = words.pop()
+                yield from words
+                chunk = read(1 << 20)
+
+            if buffer:
+                yield buffer
+
+    def _iter_file_mmap(self, delimiter: str = "\n") -> Iterator[str]:
+
+        """
+        This generator returns words from a memory mapped wordlist
+        (a regular and non-empty file), the file is split in windows
+        ending on a delimiter. Line endings are translated like
+        in text mode ("\\r\\n" and "\\r" are read as "\\n").
+
+        >>> p = PatternEnumerator("file", None, True, "test.txt")
+        >>> list(p._iter_file_mmap())[-2:]
+        ['abcb1', 'abcb3']
+        >>> from tempfile import TemporaryDirectory
+        >>> with TemporaryDirectory() as directory:
+        ...     p.filename = path.join(directory, "crlf.txt")
+        ...     with open(p.filename, "wb") as file:
+        ...         _ = file.write(b"a\\r\\nb\\rc\\r\\n\\r\\nd\\r")
+        ...     list(p._iter_file_mmap()), list(p._iter_file_mmap(","))
+        (['a', 'b', 'c', '', 'd'], ['a\\nb\\nc\\n\\nd\\n'])
         >>>
         """
 
-        word = last = file.read(1)
-        while last != delimiter and last:
-            last = file.read(1)
-            if last != delimiter:
-                word += last
+        separator = delimiter.encode("utf-8")
+        newline = delimiter == "\n"
 
-        return word
+        with open(self.filename, "rb") as file, mmap(
+            file.fileno(), 0, access=ACCESS_READ
+        ) as data:
+            size = len(data)
+            find = data.find
+            rfind = data.rfind
+            position = 0
+
+            while position < size:
+                end = rfind(separator, position, position + (1 << 20))
+                if end == -1:
+                    end = find(separator, position)
+                    if end == -1:
+                        end = size
+
+                text = data[position:end].decode("utf-8")
+                if "\r" in text:
+                    if newline and text[-1] == "\r":
+                        text = text[:-1]
+                    text = text.replace("\r\n", "\n").replace("\r", "\n")
+
+                yield from text.split(delimiter)
+                position = end + len(separator)
 
 
 class WordList:
@@ -271,25 +447,32 @@ class WordList:
         max_words: int = None,
         max_time: float = None,
         encoding: str = "utf-8",
+        parallel: bool = False,
     ):
         self.counter = 0
+        self.parallel = parallel
         self.max_time = max_time
         self.patterns = patterns
         self.encoding = encoding
+        self.filename = filename
         self.max_words = max_words
         self.delimiter = delimiter
         self.start_time = perf_counter()
-        self.output = (
-            stdout
-            if filename is None
-            else open(filename, "w", encoding=encoding)
-        )
-        self.regex = recompile(
-            "(%s)"
-            % "|".join(
-                [f"%\\({patterns[name].name}\\)" for name in patterns.keys()]
+        self.binary_encoding = None
+
+        if filename is not None and linesep == "\n":
+            codec = lookup(encoding or getpreferredencoding(False)).name
+            if codec in ("utf-8", "ascii"):
+                self.binary_encoding = codec
+
+        if filename is None:
+            self.output = stdout
+        elif self.binary_encoding:
+            self.output = open(filename, "wb", buffering=1 << 20)
+        else:
+            self.output = open(
+                filename, "w", encoding=encoding, buffering=1 << 20
             )
-        )
 
     def run(self, string: str) -> None:
 
@@ -307,63 +490,590 @@ class WordList:
         >>>
         """
 
-        for multivalues in finditer(r"(%\(.*?\))\{(\d+)\}", string):
-            data = multivalues.group()
-            string = string.replace(
-                data, multivalues.group(1) * int(multivalues.group(2))
+        string = _MULT_RE.sub(
+            lambda result: result.group(1) * int(result.group(2)), string
+        )
+
+        segments, slots = self._plan(string)
+
+        words = self.count_words(slots)
+
+        if (
+            words is not None
+            and words >= JIT_MIN_WORDS
+            and self.is_packable(segments, slots)
+            and _load_emit_njit() is not None
+        ):
+            self.write_packed_words(segments, slots)
+        elif (
+            self.parallel
+            and self.binary_encoding
+            and self.max_words is None
+            and self.max_time is None
+        ):
+            self.write_parallel_words(segments, slots)
+        else:
+            self._loop(self.generate_words(segments, slots))
+
+        if self.output is not stdout:
+            self.output.close()
+
+    def _loop(self, words: Iterator[Union[str, bytes]]) -> None:
+
+        """
+        This function writes words with the loop matching the limits.
+
+        >>> from io import StringIO
+        >>> w = WordList({}, max_words=2)
+        >>> w.output = StringIO()
+        >>> w._loop(iter(["a\\n", "b\\n", "c\\n"]))
+        >>> w.max_words = None
+        >>> w._loop(iter(["d\\n", "e\\n", "f\\n"]))
+        >>> w.max_words = 0
+        >>> w._loop(iter(["g\\n"]))
+        >>> w.output.getvalue().split(), w.counter
+        (['a', 'b', 'd', 'e', 'f'], 5)
+        >>>
+        """
+
+        if self.max_time is not None:
+            self._loop_max_time(words)
+        elif self.max_words is not None:
+            self._loop_max_words(words)
+        else:
+            self._loop_unbounded(words)
+
+    def _loop_unbounded(self, words: Iterator[Union[str, bytes]]) -> None:
+
+        """
+        This function writes all words.
+        """
+
+        write = self.output.write
+        join = (b"" if self.binary_encoding else "").join
+        slice_ = islice
+        size = BATCH_SIZE
+        counter = self.counter
+        batch = list(slice_(words, size))
+
+        while batch:
+            write(join(batch))
+            counter += len(batch)
+            batch = list(slice_(words, size))
+
+        self.counter = counter
+
+    def _loop_max_words(self, words: Iterator[Union[str, bytes]]) -> None:
+
+        """
+        This function writes the max_words first words.
+        """
+
+        self._loop_unbounded(islice(words, self.max_words))
+
+    def _loop_max_time(self, words: Iterator[Union[str, bytes]]) -> None:
+
+        """
+        This function writes words until max_time is exceeded, time is
+        checked after the first word and then every CLOCK_INTERVAL words.
+        """
+
+        if self.max_words is not None:
+            words = islice(words, self.max_words)
+
+        write = self.output.write
+        join = (b"" if self.binary_encoding else "").join
+        max_time = self.max_time
+        start_time = self.start_time
+        clock = perf_counter
+        slice_ = islice
+        size = CLOCK_INTERVAL
+        counter = self.counter
+        batch = list(slice_(words, 1))
+
+        while batch:
+            write(join(batch))
+            counter += len(batch)
+
+            if clock() - start_time > max_time:
+                break
+
+            batch = list(slice_(words, size))
+
+        self.counter = counter
+
+    def write_parallel_words(
+        self, segments: List[str], slots: List[str]
+    ) -> None:
+
+        """
+        This function splits values of the first pattern between
+        worker processes, each one writes its words directly
+        in the binary output file at the offset of its chunk.
+
+        >>> import WordListGenerator
+        >>> from tempfile import TemporaryDirectory
+        >>> cpu_count = WordListGenerator.cpu_count
+        >>> WordListGenerator.cpu_count = lambda: 3
+        >>> patterns = {
+        ...     "%(a)": PatternEnumerator("a", tuple("abcd\\xe9"), False, None),
+        ...     "%(f)": PatternEnumerator(
+        ...         "f", ("abcc1", "abcc3", "abcc2", "abcb1", "abcb3"), False, None
+        ...     ),
+        ... }
+        >>> outputs = []
+        >>> with TemporaryDirectory() as directory:
+        ...     for parallel in (False, True):
+        ...         filename = path.join(directory, str(parallel))
+        ...         wordlist = WordList(patterns, filename, parallel=parallel)
+        ...         wordlist.run("%(a)-%(f)%(a)")
+        ...         with open(filename, "rb") as file:
+        ...             outputs.append(file.read())
+        >>> WordListGenerator.cpu_count = cpu_count
+        >>> outputs[0] == outputs[1], len(outputs[1]), wordlist.counter
+        (True, 1175, 125)
+        >>>
+        """
+
+        value_lists = self.get_value_lists(slots)
+        workers = cpu_count() or 1
+
+        if (
+            workers < 2
+            or not slots
+            or None in value_lists
+            or len(value_lists[0]) < workers
+        ):
+            self._loop(self.generate_words(segments, slots, value_lists))
+            return None
+
+        template = self._template(segments).encode(self.binary_encoding)
+        first_values = value_lists[0]
+        size = -(-len(first_values) // workers)
+
+        self.output.flush()
+        offset = self.output.tell()
+
+        with ProcessPoolExecutor(workers) as pool:
+            jobs = []
+
+            for index in range(0, len(first_values), size):
+                chunk = [first_values[index : index + size], *value_lists[1:]]
+                jobs.append(
+                    pool.submit(
+                        _write_words, template, chunk, self.filename, offset
+                    )
+                )
+                offset += _words_size(template, chunk)
+
+            self.output.truncate(offset)
+
+            for job in jobs:
+                job.result()
+
+        self.output.seek(offset)
+        self.counter += prod(map(len, value_lists))
+
+    def count_words(self, slots: List[str]) -> Optional[int]:
+
+        """
+        This function returns the number of words to write without
+        reading wordlist files (None when a pattern is a wordlist file).
+
+        >>> w = WordList({"%(1)": PatternEnumerator("1", ["1", "2"], False, None)})
+        >>> w.count_words(["%(1)", "%(1)"])
+        4
+        >>> w.max_words = 3
+        >>> w.count_words(["%(1)", "%(1)"])
+        3
+        >>> w.patterns["%(f)"] = PatternEnumerator("f", None, True, "test.txt")
+        >>> w.count_words(["%(1)", "%(f)"])
+        >>>
+        """
+
+        words = 1
+
+        for slot in slots:
+            enumerator = self.patterns[slot]
+            if enumerator.is_file:
+                return None
+            words *= len(enumerator.chars)
+
+        if self.max_words is not None:
+            return min(words, self.max_words)
+
+        return words
+
+    def is_packable(self, segments: List[str], slots: List[str]) -> bool:
+
+        """
+        This function returns True when words can be built from
+        bytes arrays (only single ASCII characters in patterns).
+
+        >>> w = WordList({"%(1)": PatternEnumerator("1", ["1", "2"], False, None)})
+        >>> w.is_packable(*w._plan('AB%(1)'))
+        True
+        >>> w.is_packable(*w._plan('AB\xe9%(1)'))
+        False
+        >>> w = WordList({"%(1)": PatternEnumerator("1", ["1", "22"], False, None)})
+        >>> w.is_packable(*w._plan('AB%(1)'))
+        False
+        >>>
+        """
+
+        if not slots or not "".join(segments + [self.delimiter]).isascii():
+            return False
+
+        for slot in set(slots):
+            enumerator = self.patterns[slot]
+            if enumerator.is_file:
+                return False
+
+            for value in enumerator.get_values(self.encoding, self.delimiter):
+                if len(value) != 1 or not value.isascii():
+                    return False
+
+        return True
+
+    def pack_words(
+        self, segments: List[str], slots: List[str]
+    ) -> Tuple["numpy.ndarray", ...]:
+
+        """
+        This function returns bytes arrays used by _emit_words:
+        characters of each pattern, number of characters
+        of each pattern, the word template and slots offsets.
+
+        >>> try:
+        ...     import numpy
+        ... except ImportError:
+        ...     numpy = None
+        >>> w = WordList({
+        ...     "%(1)": PatternEnumerator("1", ["1", "2"], False, None),
+        ...     "%(a)": PatternEnumerator("a", ["a", "b", "c"], False, None),
+        ... })
+        >>> segments, slots = w._plan("X%(1)-%(a)%(1)")
+        >>> expected = "".join(w.generate_words(segments, slots)).encode()
+        >>> if numpy is not None:
+        ...     chars, lengths, template, offsets = w.pack_words(segments, slots)
+        ...     indices = numpy.zeros(len(slots), dtype=numpy.int64)
+        ...     output = numpy.empty(12 * template.shape[0], dtype=numpy.uint8)
+        ...     size = _emit_words(
+        ...         chars, lengths, template, offsets, indices, output, 5
+        ...     )
+        ...     size += _emit_words(
+        ...         chars, lengths, template, offsets, indices, output[size:], 7
+        ...     )
+        ...     assert output[:size].tobytes() == expected
+        >>>
+        """
+
+        import numpy
+
+        value_lists = [
+            "".join(
+                self.patterns[slot].get_values(self.encoding, self.delimiter)
             )
+            for slot in slots
+        ]
+        lengths = numpy.array(
+            [len(values) for values in value_lists], dtype=numpy.int64
+        )
+        chars = numpy.zeros((len(slots), lengths.max()), dtype=numpy.uint8)
 
-        check_counter = self.max_words is not None
-        check_time = self.max_time is not None
+        for index, values in enumerate(value_lists):
+            chars[index, : len(values)] = bytearray(values, "ascii")
+
+        template = bytearray()
+        offsets = []
+
+        for segment in segments[:-1]:
+            template += segment.encode("ascii")
+            offsets.append(len(template))
+            template.append(0)
+
+        template += (segments[-1] + self.delimiter).encode("ascii")
+        template = numpy.frombuffer(template, dtype=numpy.uint8)
+        offsets = numpy.array(offsets, dtype=numpy.int64)
+        return chars, lengths, template, offsets
+
+    def write_packed_words(self, segments: List[str], slots: List[str]) -> None:
+
+        """
+        This function writes words built by the compiled
+        _emit_words function from bytes arrays.
+        """
 
-        for word in self.visit_pattern(string):
-            self.counter += 1
-            self.output.write(f"{word}{self.delimiter}")
+        import numpy
 
-            if (check_counter and self.counter >= self.max_words) or (
-                check_time and perf_counter() - self.start_time > self.max_time
+        chars, lengths, template, offsets = self.pack_words(segments, slots)
+        indices = numpy.zeros(len(slots), dtype=numpy.int64)
+        output = numpy.empty(BATCH_SIZE * template.shape[0], dtype=numpy.uint8)
+
+        remaining = prod(lengths.tolist())
+        if self.max_words is not None:
+            remaining = min(remaining, self.max_words)
+
+        check_time = self.max_time is not None
+        batch = CLOCK_INTERVAL if check_time else BATCH_SIZE
+        count = 1 if check_time else batch
+
+        while remaining > 0:
+            count = min(count, remaining)
+            size = _emit_njit(
+                chars, lengths, template, offsets, indices, output, count
+            )
+            if self.binary_encoding:
+                self.output.write(output[:size])
+            else:
+                self.output.write(output[:size].tobytes().decode("ascii"))
+            self.counter += count
+            remaining -= count
+
+            if (
+                check_time
+                and perf_counter() - self.start_time > self.max_time
             ):
                 break
 
-        if self.output is not stdout:
-            self.output.close()
+            count = batch
 
-    def visit_pattern(self, string: str) -> StringOrNone:
+    def _plan(self, string: str) -> Tuple[List[str], List[str]]:
 
         """
-        This function find first pattern in a string.
+        This function splits a string into literal segments
+        and patterns (segments[i] is before slots[i]).
 
         >>> w = WordList({"%(1)": PatternEnumerator("1", ["1", "2"], False, None)})
-        >>> for word in w.visit_pattern('AB%(1)'): print(word)
-        AB1
-        AB2
+        >>> w._plan('A%(1)B%(1)')
+        (['A', 'B', ''], ['%(1)', '%(1)'])
+        >>> w = WordList({
+        ...     "%(a)": PatternEnumerator("a", ["1"], False, None),
+        ...     "%(a+)": PatternEnumerator("a+", ["2"], False, None),
+        ... })
+        >>> w._plan('%(a+)%(aa)%(a)')
+        (['', '%(aa)', ''], ['%(a+)', '%(a)'])
         >>>
         """
 
-        result = self.regex.search(string)
+        patterns = self.patterns
+        find = string.find
+        segments = []
+        slots = []
+        last = 0
+        start = find("%(")
 
-        if result is not None:
-            yield from self.launch_pattern_loop(string, result.group())
-        else:
-            yield string
+        while start != -1:
+            end = find(")", start + 2)
+            if end == -1:
+                break
+
+            key = string[start : end + 1]
+            if key in patterns:
+                segments.append(string[last:start])
+                slots.append(key)
+                last = end + 1
+                start = find("%(", last)
+            else:
+                start = find("%(", start + 1)
 
-    def launch_pattern_loop(self, string: str, pattern: str) -> None:
+        segments.append(string[last:])
+        return segments, slots
 
+    def _template(self, segments: List[str]) -> str:
+
+        """
+        This function returns the %-format string of words
+        (segments with a %s between them and the delimiter).
+
+        >>> w = WordList({})
+        >>> w._template(["A%", "B", ""])
+        'A%%%sB%s\\n'
+        >>>
         """
-        This function replaces PatternEnumerator
-        and generates strings from pattern.
+
+        return "%s".join(
+            segment.replace("%", "%%") for segment in segments
+        ) + self.delimiter.replace("%", "%%")
+
+    def generate_words(
+        self,
+        segments: List[str],
+        slots: List[str],
+        value_lists: List[Optional[List[Union[str, bytes]]]] = None,
+    ) -> Iterator[Union[str, bytes]]:
+
+        """
+        This generator builds strings (terminated by the delimiter)
+        from segments and patterns (values are loaded
+        with get_value_lists when value_lists is None),
+        strings are encoded when the output file is binary.
 
         >>> w = WordList({"%(1)": PatternEnumerator("1", ["1", "2"], False, None)})
-        >>> for word in w.visit_pattern('AB%(1)'): print(word)
-        AB1
-        AB2
+        >>> for word in w.generate_words(*w._plan('A%B%(1)')): print(word, end="")
+        A%B1
+        A%B2
+        >>> w = WordList({
+        ...     "%(d)": PatternEnumerator("d", ["1", "2"], False, None),
+        ...     "%(f)": PatternEnumerator("f", None, True, "test.txt"),
+        ... })
+        >>> segments, slots = w._plan("%(d)-%(f)")
+        >>> w.get_value_lists(slots)
+        [['1', '2'], None]
+        >>> print(*list(w.generate_words(segments, slots))[:4], sep="", end="")
+        1-abcc1
+        2-abcc1
+        1-abcc3
+        2-abcc3
+        >>> w.binary_encoding = "utf-8"
+        >>> list(w.generate_words(segments, slots))[:4]
+        [b'1-abcc1\\n', b'2-abcc1\\n', b'1-abcc3\\n', b'2-abcc3\\n']
         >>>
         """
 
-        enumerator = self.patterns[pattern]
+        template = self._template(segments)
+        if value_lists is None:
+            value_lists = self.get_value_lists(slots)
 
-        for value in enumerator.get_values(self.encoding, self.delimiter):
-            yield from self.visit_pattern(string.replace(pattern, value, 1))
+        if self.binary_encoding:
+            template = template.encode(self.binary_encoding)
+
+        if None not in value_lists:
+            yield from map(template.__mod__, product(*value_lists))
+            return
+
+        order = sorted(
+            range(len(slots)), key=lambda index: value_lists[index] is not None
+        )
+        yield from self.fill_slot(
+            template, [""] * len(slots), slots, value_lists, order, 0
+        )
+
+    def get_value_lists(
+        self, slots: List[str]
+    ) -> List[Optional[List[Union[str, bytes]]]]:
+
+        """
+        This function loads values of each pattern in memory,
+        values are None when a wordlist file is streamed: a file
+        used only once in the string is read only once, and a file
+        is loaded only when it is small (words use much more memory
+        than the file content), values are encoded while they are
+        loaded when the output file is binary.
+
+        >>> w = WordList({
+        ...     "%(1)": PatternEnumerator("1", ["1", "2"], False, None),
+        ...     "%(f)": PatternEnumerator("f", None, True, "test.txt"),
+        ... })
+        >>> w.get_value_lists(["%(1)", "%(1)"])
+        [['1', '2'], ['1', '2']]
+        >>> w.get_value_lists(["%(1)", "%(f)"])
+        [['1', '2'], None]
+        >>> w.get_value_lists(["%(f)", "%(f)"])[0]
+        ['abcc1', 'abcc3', 'abcc2', 'abcb1', 'abcb3']
+        >>> w.patterns["%(1)"] = PatternEnumerator("1", ["\xe9"], False, None)
+        >>> w.binary_encoding = "utf-8"
+        >>> w.get_value_lists(["%(1)", "%(f)"])
+        [[b'\\xc3\\xa9'], None]
+        >>>
+        """
+
+        value_lists = {}
+        stream_all = (
+            sum(self.patterns[slot].is_file for slot in slots) < 2
+        )
+
+        for slot in slots:
+            if slot in value_lists:
+                continue
+
+            enumerator = self.patterns[slot]
+            if enumerator.is_file and (
+                stream_all
+                or path.getsize(enumerator.filename) > MAX_FILE_SIZE
+            ):
+                value_lists[slot] = None
+            else:
+                values = enumerator.get_values(self.encoding, self.delimiter)
+                if self.binary_encoding:
+                    encoding = self.binary_encoding
+                    values = (value.encode(encoding) for value in values)
+                value_lists[slot] = list(values)
+
+        return [value_lists[slot] for slot in slots]
+
+    def fill_slot(
+        self,
+        template: Union[str, bytes],
+        values: List[Union[str, bytes]],
+        slots: List[str],
+        value_lists: List[Optional[List[Union[str, bytes]]]],
+        order: List[int],
+        index: int,
+    ) -> Iterator[Union[str, bytes]]:
+
+        """
+        This generator writes values of a pattern in the values list
+        and generates strings from the following patterns.
+
+        Patterns are visited in order: wordlist files that are not
+        loaded in memory come first, so each one is read only once
+        (except when there are many large wordlists in the string),
+        the last one is read by batches and combined with the loaded
+        patterns using itertools.product.
+        """
+
+        position = order[index]
+        slot_values = self.patterns[slots[position]].get_values(
+            self.encoding, self.delimiter
+        )
+        if self.binary_encoding:
+            encoding = self.binary_encoding
+            slot_values = (value.encode(encoding) for value in slot_values)
+
+        if index + 1 < len(order) and value_lists[order[index + 1]] is None:
+            for value in slot_values:
+                values[position] = value
+                yield from self.fill_slot(
+                    template, values, slots, value_lists, order, index + 1
+                )
+            return
+
+        if self.binary_encoding:
+            marker, percent = b"%s", b"%"
+        else:
+            marker, percent = "%s", "%"
+
+        escaped = percent * 2
+        arguments = [position]
+        loaded = []
+        fixed = []
+
+        for slot_position, (value, slot_list) in enumerate(
+            zip(values, value_lists)
+        ):
+            if slot_list is not None:
+                arguments.append(slot_position)
+                loaded.append(slot_list)
+                fixed.append(marker)
+            elif slot_position == position:
+                fixed.append(marker)
+            else:
+                fixed.append(value.replace(percent, escaped))
+
+        template = template.replace(escaped, escaped * 2) % tuple(fixed)
+        arguments = sorted(range(len(arguments)), key=arguments.__getitem__)
+        getter = (
+            None if arguments == sorted(arguments) else itemgetter(*arguments)
+        )
+
+        batch = list(islice(slot_values, BATCH_SIZE))
+        while batch:
+            combinations = product(batch, *loaded)
+            if getter is not None:
+                combinations = map(getter, combinations)
+            yield from map(template.__mod__, combinations)
+            batch = list(islice(slot_values, BATCH_SIZE))
 
 
 def parse() -> Namespace:
@@ -372,9 +1082,18 @@ def parse() -> Namespace:
     This function parse arguments.
     """
 
-    parser = ArgumentParser(description="This script builds custom wordlist.")
+    parser = ArgumentParser(
+        description="This script builds custom wordlist.",
+        formatter_class=RawDescriptionHelpFormatter,
+    )
     add_argument = parser.add_argument
 
+    add_argument(
+        "--version",
+        "-v",
+        action="version",
+        version=f"WordListGenerator {__version__}\n{copyright}",
+    )
     add_argument(
         "--pattern",
         "-p",
@@ -413,6 +1132,12 @@ def parse() -> Namespace:
         "-f",
         help="File to save the wordlist (default is terminal).",
     )
+    add_argument(
+        "--parallel",
+        "-P",
+        help="Build the wordlist file with one process by CPU.",
+        action="store_true",
+    )
 
     return parser.parse_args()
 
@@ -485,6 +1210,7 @@ def main() -> int:
         args.max_words,
         args.max_time,
         args.encoding,
+        args.parallel,
     )
     wordlist.run(args.pattern)
 